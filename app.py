@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import io
+from datetime import datetime, date
 import sqlalchemy
 import bcrypt
+import tarefas
+from tarefas import TABELA_ARQUIVO, COLUNAS_AGENDAMENTO, ESCOLA_PADRAO, OPCOES_PADRAO
+from tarefas import CAPACIDADE_PADRAO_EQUIPAMENTO, CAPACIDADE_ILIMITADA
 
 # --- Configurações da Página ---
 st.set_page_config(
@@ -12,22 +18,22 @@ st.set_page_config(
     layout="wide"
 )
 
-# --- Constantes ---
-DISCIPLINAS = ["Matemática", "Física", "Química", "Português", "Inglês", "História", "Geografia", "Biologia"]
-EQUIPAMENTOS = ["Notebook", "Celular", "Tablet", "Projetor", "Caixa de Som"]
-HORARIOS = ["1º", "2º", "3º", "4º", "5º", "6º"]
-TURNOS = ["Manhã", "Tarde"]
-SALAS = ["205", "206"]
-
-# --- CONFIGURAÇÕES DE ACESSO ---
-CODIGO_CADASTRO = "SESI2024"  # 🔑 Código para cadastro
-ADMINS = ["admin", "diretor", "coordenador", "secretaria"]  # 👨‍💼 Administradores
+# --- ESCOLAS (MULTI-TENANT) ---
+# Cada escola tem suas opções, administradores e código de cadastro nas tabelas
+# escolas / escola_opcoes / escola_admins. A escola é escolhida pela URL (?escola=slug).
+# A escola padrão é criada pela migração do banco (tarefas.py --migrar).
 
 # --- STATUS DE AGENDAMENTO ---
 STATUS_PENDENTE = "Pendente"
 STATUS_APROVADO = "Aprovado"
 STATUS_REJEITADO = "Rejeitado"
 
+# --- EVENTOS (HISTÓRICO DE AGENDAMENTOS) ---
+EVENTO_CRIADO = "criado"
+EVENTO_STATUS = "status"
+EVENTO_OBSERVACAO = "observacao"
+DIAS_METRICAS_RESPOSTA = 30  # ⏱️ Janela do tempo de resposta dos administradores
+
 # Cores para cada status
 STATUS_COLORS = {
     STATUS_PENDENTE: "🟡",    # Amarelo
@@ -35,6 +41,14 @@ STATUS_COLORS = {
     STATUS_REJEITADO: "🔴"    # Vermelho
 }
 
+# --- COLUNAS POR TELA ---
+# Cada tela busca só o que exibe (sem created_at/tenant_id); o badge do status
+# vem pronto do banco na coluna "Status_Display".
+COLUNAS_PROFESSOR = ["Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Status", "Observacoes"]
+COLUNAS_ADMIN = ["id", "Data", "Professor", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Status", "Observacoes"]
+# Tipos Arrow das colunas não textuais na leitura colunar (as demais chegam como texto)
+TIPOS_COLUNARES = {"id": pa.int64(), "Data": pa.date32(), "arquivado": pa.bool_(), "created_at": pa.timestamp("us")}
+
 # --- Conexão com o Banco de Dados ---
 @st.cache_resource
 def init_connection():
@@ -47,18 +61,75 @@ def init_connection():
         st.info("💡 Certifique-se de que as credenciais do Supabase estão configuradas corretamente no Streamlit Cloud.")
         st.stop()
 
+@st.cache_resource
+def carregar_config_escola(slug):
+    """Carrega a configuração da escola uma vez por processo."""
+    conn = init_connection()
+    with conn.session as s:
+        escola = s.execute(
+            sqlalchemy.text("SELECT id, slug, nome, codigo_cadastro FROM escolas WHERE slug = :slug"),
+            {'slug': slug}
+        ).mappings().first()
+        if escola is None:
+            # Exceções não são cacheadas: a escola pode ser criada depois
+            raise LookupError(f"Escola '{slug}' não encontrada.")
+        
+        config = dict(escola)
+        config.update({categoria: [] for categoria in OPCOES_PADRAO})
+        config['capacidades'] = {}  # equipamento -> unidades por horário (só para exibir no formulário)
+        opcoes = s.execute(
+            sqlalchemy.text("""SELECT categoria, valor, capacidade FROM escola_opcoes
+                WHERE tenant_id = :tenant_id ORDER BY categoria, ordem"""),
+            {'tenant_id': escola['id']}
+        )
+        for categoria, valor, capacidade in opcoes:
+            config.setdefault(categoria, []).append(valor)
+            if categoria == "equipamentos":
+                config['capacidades'][valor] = capacidade
+        
+        admins = s.execute(
+            sqlalchemy.text("SELECT username FROM escola_admins WHERE tenant_id = :tenant_id ORDER BY username"),
+            {'tenant_id': escola['id']}
+        )
+        config['admins'] = [row[0] for row in admins]
+    return config
+
+def escola_atual():
+    """Retorna a configuração da escola da sessão."""
+    return carregar_config_escola(st.session_state.get('escola', ESCOLA_PADRAO))
+
+def tenant_atual():
+    """Retorna o id da escola da sessão."""
+    return escola_atual()['id']
+
 # --- Funções de Verificação ---
 def eh_admin(username):
     """Verifica se o usuário é administrador"""
-    return username in ADMINS
+    return username in escola_atual()['admins']
 
 def obter_tipo_usuario(username):
     """Retorna o tipo do usuário para exibição"""
     return "👨‍💼 Administrador" if eh_admin(username) else "👩‍🏫 Professor"
 
-def obter_cor_status(status):
-    """Retorna a cor/emoji do status"""
-    return STATUS_COLORS.get(status, "⚪")
+def sql_status_display():
+    """Monta o CASE que formata o badge do status (cor/emoji + texto) no próprio banco"""
+    casos = " ".join(f"WHEN '{status}' THEN '{cor} {status}'" for status, cor in STATUS_COLORS.items())
+    return f'CASE "Status" {casos} ELSE \'⚪ \' || "Status" END AS "Status_Display"'
+
+def inicio_periodo_atual():
+    """Retorna o primeiro dia do mês corrente (limite do arquivamento)"""
+    hoje = date.today()
+    return hoje.replace(day=1)
+
+def origem_agendamentos(incluir_historico=False):
+    """Retorna a origem da consulta: só a tabela atual ou atual + arquivo"""
+    if not incluir_historico:
+        return 'agendamentos'
+    return f"""(
+        SELECT {COLUNAS_AGENDAMENTO}, FALSE AS arquivado FROM agendamentos
+        UNION ALL
+        SELECT {COLUNAS_AGENDAMENTO}, TRUE AS arquivado FROM {TABELA_ARQUIVO}
+    ) AS agendamentos"""
 
 # --- Funções do Banco de Dados ---
 
@@ -115,128 +186,33 @@ def adicionar_coluna_seguro(conn, tabela, coluna, tipo, default=None):
         
         return False
 
+@st.cache_data(ttl=60, show_spinner=False)
+def versao_schema_banco():
+    """Versão do schema gravada no banco (consultada no máximo uma vez por minuto)."""
+    conn = init_connection()
+    with conn.session as s:
+        return tarefas.versao_schema(s)
+
 def inicializar_banco():
-    """Cria as tabelas no banco de dados se elas não existirem."""
+    """Confere se o banco já foi migrado para a versão que o app espera.
+
+    Criar e migrar tabelas é tarefa do worker (python tarefas.py --migrar),
+    não da renderização das páginas.
+    """
     try:
-        conn = init_connection()
-        
-        # Verifica se as tabelas já existem
-        with conn.session as s:
-            result = s.execute(sqlalchemy.text("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name IN ('usuarios', 'agendamentos')
-            """))
-            existing_tables = [row[0] for row in result.fetchall()]
-            
-            # Cria tabela usuarios se não existir
-            if 'usuarios' not in existing_tables:
-                s.execute(sqlalchemy.text('''
-                    CREATE TABLE usuarios (
-                        id SERIAL PRIMARY KEY,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    );
-                '''))
-                s.commit()
-                st.success("✅ Tabela 'usuarios' criada com sucesso!")
-                
-            # Cria tabela agendamentos se não existir
-            if 'agendamentos' not in existing_tables:
-                s.execute(sqlalchemy.text('''
-                    CREATE TABLE agendamentos (
-                        id SERIAL PRIMARY KEY,
-                        "Data" DATE NOT NULL,
-                        "Disciplina" TEXT,
-                        "Equipamentos" TEXT,
-                        "Horario" TEXT,
-                        "Turno" TEXT,
-                        "Sala" TEXT,
-                        "Professor" TEXT,
-                        "Status" TEXT DEFAULT 'Pendente',
-                        "Observacoes" TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    );
-                '''))
-                s.commit()
-                st.success("✅ Tabela 'agendamentos' criada com sucesso!")
-            # else:
-            #     # Tabela existe, verificar se precisa adicionar novas colunas
-            #     st.info("ℹ️ Verificando estrutura da tabela agendamentos...")
-                
-            #     # Adiciona colunas uma por vez de forma segura
-            #     adicionar_coluna_seguro(conn, 'agendamentos', 'Status', 'TEXT', 'Pendente')
-            #     adicionar_coluna_seguro(conn, 'agendamentos', 'Observacoes', 'TEXT')
-            #     # updated_at removido - não é necessário para funcionamento
-                
-            #     # Atualiza registros antigos que não têm status
-            #     try:
-            #         with conn.session as s:
-            #             s.execute(sqlalchemy.text("""
-            #                 UPDATE agendamentos 
-            #                 SET "Status" = 'Pendente' 
-            #                 WHERE "Status" IS NULL
-            #             """))
-            #             s.commit()
-            #             st.info("ℹ️ Registros antigos atualizados com status padrão.")
-            #     except Exception as e:
-            #         st.warning(f"⚠️ Aviso ao atualizar registros: {str(e)}")
-            
-        return conn
-            
+        versao = versao_schema_banco()
     except Exception as e:
-        st.error(f"❌ Erro ao inicializar banco de dados: {str(e)}")
-        
-        # Tenta recuperar mostrando opção de reset
-        st.error("🔧 **Problema detectado na estrutura do banco!**")
-        
-        if st.button("🔄 Tentar Resetar Estrutura"):
-            try:
-                conn = init_connection()
-                with conn.session as s:
-                    # Remove tabela problemática e recria
-                    s.execute(sqlalchemy.text("DROP TABLE IF EXISTS agendamentos_backup"))
-                    s.execute(sqlalchemy.text("""
-                        CREATE TABLE agendamentos_backup AS 
-                        SELECT * FROM agendamentos
-                    """))
-                    s.execute(sqlalchemy.text("DROP TABLE agendamentos"))
-                    s.execute(sqlalchemy.text('''
-                        CREATE TABLE agendamentos (
-                            id SERIAL PRIMARY KEY,
-                            "Data" DATE NOT NULL,
-                            "Disciplina" TEXT,
-                            "Equipamentos" TEXT,
-                            "Horario" TEXT,
-                            "Turno" TEXT,
-                            "Sala" TEXT,
-                            "Professor" TEXT,
-                            "Status" TEXT DEFAULT 'Pendente',
-                            "Observacoes" TEXT,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        );
-                    '''))
-                    
-                    # Restaura dados
-                    s.execute(sqlalchemy.text("""
-                        INSERT INTO agendamentos 
-                        ("Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor", created_at)
-                        SELECT "Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor", created_at
-                        FROM agendamentos_backup
-                    """))
-                    
-                    s.execute(sqlalchemy.text("DROP TABLE agendamentos_backup"))
-                    s.commit()
-                    
-                st.success("✅ Estrutura resetada com sucesso!")
-                st.rerun()
-                
-            except Exception as reset_error:
-                st.error(f"❌ Erro no reset: {str(reset_error)}")
-        
+        st.error(f"❌ Erro ao conectar ao banco de dados: {str(e)}")
+        st.stop()
+    
+    if versao < tarefas.SCHEMA_VERSAO:
+        st.error("🔧 **O banco de dados precisa ser atualizado!**")
+        st.info(f"ℹ️ Versão do banco: {versao} — versão esperada: {tarefas.SCHEMA_VERSAO}. "
+                "Inicie o worker ou execute a migração e recarregue a página:")
+        st.code("python tarefas.py --migrar", language="bash")
         st.stop()
+    
+    return init_connection()
 
 def hash_password(password):
     """Cria um hash seguro para a senha."""
@@ -256,13 +232,16 @@ def adicionar_usuario(username, password):
         password_hash = hash_password(password)
         conn = init_connection()
         with conn.session as s:
-            result = s.execute(sqlalchemy.text("SELECT * FROM usuarios WHERE username = :user"), {'user': username}).first()
+            result = s.execute(
+                sqlalchemy.text("SELECT * FROM usuarios WHERE tenant_id = :tenant_id AND username = :user"),
+                {'tenant_id': tenant_atual(), 'user': username}
+            ).first()
             if result:
                 return False
             
             s.execute(
-                sqlalchemy.text("INSERT INTO usuarios (username, password_hash) VALUES (:user, :phash)"),
-                {'user': username, 'phash': password_hash.decode('utf-8')}
+                sqlalchemy.text("INSERT INTO usuarios (tenant_id, username, password_hash) VALUES (:tenant_id, :user, :phash)"),
+                {'tenant_id': tenant_atual(), 'user': username, 'phash': password_hash.decode('utf-8')}
             )
             s.commit()
         return True
@@ -275,12 +254,25 @@ def buscar_usuario(username):
     try:
         conn = init_connection()
         with conn.session as s:
-            result = s.execute(sqlalchemy.text("SELECT * FROM usuarios WHERE username = :user"), {'user': username}).first()
+            result = s.execute(
+                sqlalchemy.text("SELECT * FROM usuarios WHERE tenant_id = :tenant_id AND username = :user"),
+                {'tenant_id': tenant_atual(), 'user': username}
+            ).first()
             return result
     except Exception as e:
         st.error(f"Erro ao buscar usuário: {str(e)}")
         return None
 
+def registrar_evento(s, agendamento_id, tipo, usuario, status_anterior=None, status_novo=None, observacoes=None):
+    """Grava um evento no histórico. Usa a transação de quem chama (sem commit)."""
+    s.execute(
+        sqlalchemy.text('''INSERT INTO agendamento_eventos 
+            (tenant_id, agendamento_id, tipo, usuario, status_anterior, status_novo, observacoes) 
+            VALUES (:tenant_id, :agendamento_id, :tipo, :usuario, :anterior, :novo, :obs)'''),
+        {'tenant_id': tenant_atual(), 'agendamento_id': agendamento_id, 'tipo': tipo, 'usuario': usuario,
+         'anterior': status_anterior, 'novo': status_novo, 'obs': observacoes}
+    )
+
 def salvar_agendamento(data, disciplina, equipamentos, horario, turno, sala, professor):
     """Salva um novo agendamento no banco de dados com status pendente."""
     try:
@@ -289,49 +281,139 @@ def salvar_agendamento(data, disciplina, equipamentos, horario, turno, sala, pro
         with conn.session as s:
             # Verifica se a coluna Status existe antes de usá-la
             if verificar_coluna_existe(conn, 'agendamentos', 'Status'):
-                s.execute(
+                result = s.execute(
                     sqlalchemy.text('''INSERT INTO agendamentos 
-                        ("Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor", "Status") 
-                        VALUES (:data, :disc, :equip, :hor, :turno, :sala, :prof, :status)'''),
-                    params=dict(data=data, disc=disciplina, equip=equipamentos_str, 
+                        (tenant_id, "Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor", "Status") 
+                        VALUES (:tenant_id, :data, :disc, :equip, :hor, :turno, :sala, :prof, :status)
+                        RETURNING id'''),
+                    params=dict(tenant_id=tenant_atual(), data=data, disc=disciplina, equip=equipamentos_str, 
                               hor=horario, turno=turno, sala=sala, prof=professor, status=STATUS_PENDENTE)
                 )
             else:
                 # Fallback para tabelas antigas
-                s.execute(
+                result = s.execute(
                     sqlalchemy.text('''INSERT INTO agendamentos 
-                        ("Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor") 
-                        VALUES (:data, :disc, :equip, :hor, :turno, :sala, :prof)'''),
-                    params=dict(data=data, disc=disciplina, equip=equipamentos_str, 
+                        (tenant_id, "Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor") 
+                        VALUES (:tenant_id, :data, :disc, :equip, :hor, :turno, :sala, :prof)
+                        RETURNING id'''),
+                    params=dict(tenant_id=tenant_atual(), data=data, disc=disciplina, equip=equipamentos_str, 
                               hor=horario, turno=turno, sala=sala, prof=professor)
                 )
+            registrar_evento(s, result.scalar(), EVENTO_CRIADO, professor, status_novo=STATUS_PENDENTE)
             s.commit()
         return True
     except Exception as e:
         st.error(f"Erro ao salvar agendamento: {str(e)}")
         return False
 
-def atualizar_status_agendamento(agendamento_id, novo_status, observacoes=""):
-    """Atualiza o status de um agendamento."""
+def separar_equipamentos(equipamentos_str):
+    """Converte o texto "Notebook, Projetor" na lista de equipamentos."""
+    return [e.strip() for e in (equipamentos_str or "").split(",") if e.strip()]
+
+def travar_recursos(s, agendamento):
+    """Trava sala e equipamentos do horário até o fim da transação (advisory locks).
+
+    As chaves são ordenadas para que duas aprovações simultâneas nunca
+    travem os mesmos recursos em ordem diferente (deadlock).
+    """
+    horario = f"{agendamento['Data']}|{agendamento['Horario']}|{agendamento['Turno']}"
+    chaves = [f"{agendamento['tenant_id']}|sala|{agendamento['Sala']}|{horario}"]
+    for equipamento in separar_equipamentos(agendamento['Equipamentos']):
+        chaves.append(f"{agendamento['tenant_id']}|equipamento|{equipamento}|{horario}")
+    
+    for chave in sorted(chaves):
+        s.execute(sqlalchemy.text("SELECT pg_advisory_xact_lock(hashtextextended(:chave, 0))"), {'chave': chave})
+
+def verificar_conflitos(s, agendamento):
+    """Reconta, com os recursos travados, o que já está aprovado no mesmo horário."""
+    conflitos = []
+    params = {
+        'tenant_id': agendamento['tenant_id'], 'id': agendamento['id'], 'data': agendamento['Data'],
+        'horario': agendamento['Horario'], 'turno': agendamento['Turno'], 'aprovado': STATUS_APROVADO
+    }
+    filtro_horario = '''tenant_id = :tenant_id AND id <> :id AND "Status" = :aprovado
+        AND "Data" = :data AND "Horario" = :horario AND "Turno" = :turno'''
+    
+    ocupante = s.execute(
+        sqlalchemy.text(f'SELECT id, "Professor" FROM agendamentos WHERE {filtro_horario} AND "Sala" = :sala LIMIT 1'),
+        {**params, 'sala': agendamento['Sala']}
+    ).first()
+    if ocupante:
+        conflitos.append(f"🚪 Sala {agendamento['Sala']} já aprovada para {ocupante[1]} (#{ocupante[0]}) neste horário.")
+    
+    # Capacidade lida na própria transação: a configuração em cache pode estar
+    # desatualizada em outro processo. Equipamento fora da lista usa o padrão.
+    equipamentos = separar_equipamentos(agendamento['Equipamentos'])
+    capacidades = dict(s.execute(
+        sqlalchemy.text("""SELECT valor, capacidade FROM escola_opcoes
+            WHERE tenant_id = :tenant_id AND categoria = 'equipamentos' AND valor = ANY(:equipamentos)"""),
+        {'tenant_id': agendamento['tenant_id'], 'equipamentos': equipamentos}
+    ).all())
+    for equipamento in equipamentos:
+        capacidade = capacidades.get(equipamento, CAPACIDADE_PADRAO_EQUIPAMENTO)
+        if capacidade == CAPACIDADE_ILIMITADA:
+            continue
+        em_uso = s.execute(
+            sqlalchemy.text(f'''SELECT COUNT(*) FROM agendamentos WHERE {filtro_horario}
+                AND :equipamento = ANY(string_to_array("Equipamentos", ', '))'''),
+            {**params, 'equipamento': equipamento}
+        ).scalar()
+        if em_uso >= capacidade:
+            conflitos.append(f"💻 {equipamento}: {em_uso} de {capacidade} unidade(s) já aprovadas neste horário.")
+    return conflitos
+
+def atualizar_status_agendamento(agendamento_id, novo_status, observacoes="", usuario=None):
+    """Atualiza o status de um agendamento e registra o evento no histórico.
+
+    Aprovações travam o agendamento e os recursos do horário e reverificam a
+    disponibilidade na mesma transação; conflitos são exibidos e nada é gravado.
+    """
     try:
         conn = init_connection()
         with conn.session as s:
             # Verifica se as colunas existem
             if verificar_coluna_existe(conn, 'agendamentos', 'Status'):
+                agendamento = s.execute(
+                    sqlalchemy.text('''SELECT id, tenant_id, "Data", "Horario", "Turno", "Sala", "Equipamentos", "Status"
+                        FROM agendamentos 
+                        WHERE id = :id AND tenant_id = :tenant_id
+                        FOR UPDATE'''),
+                    {'id': agendamento_id, 'tenant_id': tenant_atual()}
+                ).mappings().first()
+                if agendamento is None:
+                    st.error("❌ Agendamento não encontrado.")
+                    return False
+                status_anterior = agendamento['Status']
+                
+                # Outro administrador decidiu enquanto esta tela estava aberta
+                if novo_status != status_anterior and status_anterior != STATUS_PENDENTE:
+                    st.warning(f"⚠️ Este agendamento já foi marcado como {status_anterior} por outro administrador.")
+                    return False
+                
+                if novo_status == STATUS_APROVADO and status_anterior != STATUS_APROVADO:
+                    travar_recursos(s, agendamento)
+                    conflitos = verificar_conflitos(s, agendamento)
+                    if conflitos:
+                        st.warning("⚠️ Não foi possível aprovar: recurso indisponível.\n\n" + "\n\n".join(conflitos))
+                        return False
+                
                 if verificar_coluna_existe(conn, 'agendamentos', 'Observacoes'):
                     s.execute(
                         sqlalchemy.text('''UPDATE agendamentos 
                             SET "Status" = :status, "Observacoes" = :obs
-                            WHERE id = :id'''),
-                        {'status': novo_status, 'obs': observacoes, 'id': agendamento_id}
+                            WHERE id = :id AND tenant_id = :tenant_id'''),
+                        {'status': novo_status, 'obs': observacoes, 'id': agendamento_id, 'tenant_id': tenant_atual()}
                     )
                 else:
                     s.execute(
                         sqlalchemy.text('''UPDATE agendamentos 
                             SET "Status" = :status
-                            WHERE id = :id'''),
-                        {'status': novo_status, 'id': agendamento_id}
+                            WHERE id = :id AND tenant_id = :tenant_id'''),
+                        {'status': novo_status, 'id': agendamento_id, 'tenant_id': tenant_atual()}
                     )
+                
+                tipo = EVENTO_STATUS if novo_status != status_anterior else EVENTO_OBSERVACAO
+                registrar_evento(s, agendamento_id, tipo, usuario, status_anterior, novo_status, observacoes or None)
                 s.commit()
                 return True
             else:
@@ -341,8 +423,129 @@ def atualizar_status_agendamento(agendamento_id, novo_status, observacoes=""):
         st.error(f"Erro ao atualizar status: {str(e)}")
         return False
 
-def carregar_dados(filtro_status=None, professor=None):
-    """Carrega agendamentos do banco de dados com filtros opcionais."""
+def carregar_eventos(agendamento_id):
+    """Retorna a linha do tempo de um agendamento."""
+    try:
+        conn = init_connection()
+        with conn.session as s:
+            result = s.execute(
+                sqlalchemy.text('''SELECT ts, tipo, usuario, status_anterior, status_novo, observacoes
+                    FROM agendamento_eventos
+                    WHERE agendamento_id = :id AND tenant_id = :tenant_id
+                    ORDER BY ts'''),
+                {'id': agendamento_id, 'tenant_id': tenant_atual()}
+            )
+            return pd.DataFrame(result.mappings().all())
+    except Exception as e:
+        st.error(f"Erro ao carregar histórico: {str(e)}")
+        return pd.DataFrame()
+
+def calcular_tempo_resposta(dias=DIAS_METRICAS_RESPOSTA):
+    """Calcula o tempo entre a criação e a primeira decisão (em horas) numa única consulta."""
+    try:
+        conn = init_connection()
+        with conn.session as s:
+            result = s.execute(
+                sqlalchemy.text('''SELECT COUNT(*) AS respondidos,
+                        EXTRACT(EPOCH FROM AVG(resposta)) / 3600 AS media_horas,
+                        EXTRACT(EPOCH FROM percentile_cont(0.5) WITHIN GROUP (ORDER BY resposta)) / 3600 AS mediana_horas,
+                        EXTRACT(EPOCH FROM MAX(resposta)) / 3600 AS maximo_horas
+                    FROM (
+                        -- A janela vale para a decisão; a criação pode ser anterior a ela
+                        SELECT MIN(ts) FILTER (WHERE tipo = :status AND status_novo IN (:aprovado, :rejeitado))
+                             - MIN(ts) FILTER (WHERE tipo = :criado) AS resposta
+                        FROM agendamento_eventos
+                        WHERE tenant_id = :tenant_id
+                          AND agendamento_id IN (
+                              SELECT agendamento_id FROM agendamento_eventos
+                              WHERE tenant_id = :tenant_id AND ts >= NOW() - make_interval(days => :dias)
+                                AND tipo = :status AND status_novo IN (:aprovado, :rejeitado)
+                          )
+                        GROUP BY agendamento_id
+                        HAVING MIN(ts) FILTER (WHERE tipo = :status AND status_novo IN (:aprovado, :rejeitado))
+                               >= NOW() - make_interval(days => :dias)
+                    ) AS respostas
+                    WHERE resposta IS NOT NULL'''),
+                {'status': EVENTO_STATUS, 'criado': EVENTO_CRIADO, 'aprovado': STATUS_APROVADO,
+                 'rejeitado': STATUS_REJEITADO, 'tenant_id': tenant_atual(), 'dias': dias}
+            )
+            return result.mappings().first()
+    except Exception as e:
+        st.error(f"Erro ao calcular tempo de resposta: {str(e)}")
+        return None
+
+def salvar_capacidades(capacidades):
+    """Atualiza a capacidade dos equipamentos da escola e recarrega a configuração."""
+    try:
+        conn = init_connection()
+        with conn.session as s:
+            s.execute(
+                sqlalchemy.text('''UPDATE escola_opcoes SET capacidade = :capacidade
+                    WHERE tenant_id = :tenant_id AND categoria = 'equipamentos' AND valor = :valor'''),
+                [{'capacidade': capacidade, 'tenant_id': tenant_atual(), 'valor': valor}
+                 for valor, capacidade in capacidades.items()]
+            )
+            s.commit()
+        carregar_config_escola.clear()
+        return True
+    except Exception as e:
+        st.error(f"Erro ao salvar capacidades: {str(e)}")
+        return False
+
+def enfileirar_job(tipo, payload=None):
+    """Agenda uma tarefa para o worker em segundo plano."""
+    try:
+        conn = init_connection()
+        with conn.session as s:
+            job_id = tarefas.enfileirar_job(s, tenant_atual(), tipo, payload)
+            s.commit()
+        return job_id
+    except Exception as e:
+        st.error(f"Erro ao agendar tarefa: {str(e)}")
+        return None
+
+def listar_jobs(limite=20):
+    """Lista os jobs mais recentes da fila da escola."""
+    try:
+        conn = init_connection()
+        with conn.session as s:
+            return pd.DataFrame(tarefas.listar_jobs(s, tenant_atual(), limite))
+    except Exception as e:
+        st.error(f"Erro ao listar tarefas: {str(e)}")
+        return pd.DataFrame()
+
+def consultar_colunar(conn, query, params, colunas):
+    """Executa a consulta com COPY ... TO STDOUT (CSV) e lê o resultado direto em colunas Arrow.
+
+    O resultado não passa por tuplas nem por um objeto Python por célula:
+    o CSV vai do socket para um buffer e o pyarrow monta os arrays tipados.
+    """
+    with conn.session as s:
+        compilado = sqlalchemy.text(query).compile(dialect=s.bind.dialect)
+        cursor = s.connection().connection.cursor()
+        # COPY não aceita parâmetros: o driver os escapa na própria consulta
+        sql = cursor.mogrify(compilado.string, compilado.construct_params(params)).decode()
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    buffer.seek(0)
+    tabela = pacsv.read_csv(buffer, convert_options=pacsv.ConvertOptions(
+        column_types={c: TIPOS_COLUNARES.get(c, pa.string()) for c in colunas},
+        # NULL chega sem aspas e texto vazio entre aspas
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False,
+        true_values=["t"],
+        false_values=["f"],
+    ))
+    return tabela.to_pandas(types_mapper=pd.ArrowDtype)
+
+def carregar_dados(filtro_status=None, professor=None, incluir_historico=False, colunas=None, colunar=False):
+    """Carrega agendamentos do banco de dados com filtros opcionais.
+
+    Por padrão consulta apenas a tabela atual (mês corrente e futuros);
+    com incluir_historico=True também lê a tabela de arquivo.
+    colunas limita o SELECT às colunas da tela. colunar=True (exige colunas)
+    busca o resultado com consultar_colunar, sem cache, em colunas Arrow.
+    """
     try:
         conn = init_connection()
         
@@ -350,8 +553,11 @@ def carregar_dados(filtro_status=None, professor=None):
         tem_status = verificar_coluna_existe(conn, 'agendamentos', 'Status')
         
         if tem_status:
-            query = 'SELECT * FROM agendamentos WHERE 1=1'
-            params = {}
+            selecao = ", ".join(f'"{c}"' for c in colunas) if colunas else "*"
+            if colunas and incluir_historico:
+                selecao += ", arquivado"
+            query = f'SELECT {selecao}, {sql_status_display()} FROM {origem_agendamentos(incluir_historico)} WHERE tenant_id = :tenant_id'
+            params = {'tenant_id': tenant_atual()}
             
             if filtro_status:
                 query += ' AND "Status" = :status'
@@ -363,19 +569,21 @@ def carregar_dados(filtro_status=None, professor=None):
                 
             query += ' ORDER BY "Data" DESC, created_at DESC'
             
-            if params:
-                df = conn.query(query, params=params)
+            if colunar and colunas:
+                nomes = colunas + (["arquivado"] if incluir_historico else []) + ["Status_Display"]
+                df = consultar_colunar(conn, query, params, nomes)
             else:
-                df = conn.query(query)
+                df = conn.query(query, params=params)
         else:
             # Fallback para tabelas antigas sem Status
-            query = 'SELECT *, \'Pendente\' as "Status" FROM agendamentos WHERE 1=1'
+            query = 'SELECT *, \'Pendente\' as "Status" FROM agendamentos WHERE tenant_id = :tenant_id'
+            params = {'tenant_id': tenant_atual()}
             
             if professor:
                 query += ' AND "Professor" = :professor'
-                df = conn.query(query, params={'professor': professor})
-            else:
-                df = conn.query(query)
+                params['professor'] = professor
+            
+            df = conn.query(query, params=params)
                 
             query += ' ORDER BY "Data" DESC, created_at DESC'
             
@@ -384,14 +592,18 @@ def carregar_dados(filtro_status=None, professor=None):
         st.error(f"Erro ao carregar dados: {str(e)}")
         return pd.DataFrame()
 
-def contar_agendamentos_por_status():
+def contar_agendamentos_por_status(incluir_historico=False):
     """Conta agendamentos por status para estatísticas."""
     try:
         conn = init_connection()
         
         if verificar_coluna_existe(conn, 'agendamentos', 'Status'):
             with conn.session as s:
-                result = s.execute(sqlalchemy.text('SELECT "Status", COUNT(*) FROM agendamentos GROUP BY "Status"'))
+                origem = origem_agendamentos(incluir_historico)
+                result = s.execute(
+                    sqlalchemy.text(f'SELECT "Status", COUNT(*) FROM {origem} WHERE tenant_id = :tenant_id GROUP BY "Status"'),
+                    {'tenant_id': tenant_atual()}
+                )
                 contadores = dict(result.fetchall())
                 
                 return {
@@ -402,7 +614,10 @@ def contar_agendamentos_por_status():
         else:
             # Para tabelas antigas, considera tudo como pendente
             with conn.session as s:
-                result = s.execute(sqlalchemy.text('SELECT COUNT(*) FROM agendamentos'))
+                result = s.execute(
+                    sqlalchemy.text('SELECT COUNT(*) FROM agendamentos WHERE tenant_id = :tenant_id'),
+                    {'tenant_id': tenant_atual()}
+                )
                 total = result.fetchone()[0]
                 return {STATUS_PENDENTE: total, STATUS_APROVADO: 0, STATUS_REJEITADO: 0}
     except:
@@ -429,15 +644,16 @@ def tela_professor():
         else:
             st.subheader("📝 Novo Agendamento")
             
+        escola = escola_atual()
         col1, col2 = st.columns(2)
         with col1:
             data_selecionada = st.date_input("🗓️ Selecione o Dia", min_value=datetime.today())
-            disciplina = st.selectbox("📚 Disciplina", options=DISCIPLINAS)
-            equipamentos = st.multiselect("💻 Equipamentos", options=EQUIPAMENTOS)
+            disciplina = st.selectbox("📚 Disciplina", options=escola['disciplinas'])
+            equipamentos = st.multiselect("💻 Equipamentos", options=escola['equipamentos'])
         with col2:
-            horario = st.selectbox("⏰ Horário", options=HORARIOS)
-            turno = st.selectbox("☀️ Turno", options=TURNOS)
-            sala = st.selectbox("🚪 Sala", options=SALAS)
+            horario = st.selectbox("⏰ Horário", options=escola['horarios'])
+            turno = st.selectbox("☀️ Turno", options=escola['turnos'])
+            sala = st.selectbox("🚪 Sala", options=escola['salas'])
         
         botao_texto = "📤 Enviar Solicitação" if tem_sistema_aprovacao else "✅ Salvar Agendamento"
         
@@ -468,18 +684,14 @@ def tela_professor():
         
         # Carrega dados do professor
         if filtro_status == "Todos":
-            df = carregar_dados(professor=st.session_state.username)
+            df = carregar_dados(professor=st.session_state.username, colunas=COLUNAS_PROFESSOR)
         else:
-            df = carregar_dados(filtro_status=filtro_status, professor=st.session_state.username)
+            df = carregar_dados(filtro_status=filtro_status, professor=st.session_state.username, colunas=COLUNAS_PROFESSOR)
         
         if not df.empty:
-            # Adiciona coluna com cor do status
-            df_display = df.copy()
+            # Status_Display (badge com cor) já vem formatado do banco
+            df_display = df
             if 'Status' in df_display.columns:
-                df_display['Status_Display'] = df_display['Status'].apply(
-                    lambda x: f"{obter_cor_status(x)} {x}"
-                )
-                
                 # Estatísticas rápidas
                 stats = df['Status'].value_counts()
                 col1, col2, col3 = st.columns(3)
@@ -524,8 +736,14 @@ def tela_admin():
     if tem_sistema_aprovacao:
         st.markdown("Gerencie todas as solicitações de agendamento do sistema.")
         
+        incluir_historico = st.toggle(
+            "🗄️ Incluir histórico arquivado",
+            key="admin_historico",
+            help=f"Por padrão são exibidos apenas agendamentos a partir de {inicio_periodo_atual().strftime('%d/%m/%Y')}."
+        )
+        
         # Estatísticas gerais
-        stats = contar_agendamentos_por_status()
+        stats = contar_agendamentos_por_status(incluir_historico)
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
@@ -552,11 +770,44 @@ def tela_admin():
             if stats[STATUS_PENDENTE] > 0:
                 st.warning(f"⚠️ {stats[STATUS_PENDENTE]} solicitação(ões) aguardando sua aprovação!")
 
+        with st.expander("💻 Capacidade dos Equipamentos"):
+            escola = escola_atual()
+            with st.form("form_capacidades"):
+                st.caption(f"Unidades disponíveis por horário. Use {CAPACIDADE_ILIMITADA} para sem limite. "
+                           f"Equipamentos novos começam com {CAPACIDADE_PADRAO_EQUIPAMENTO}.")
+                novas_capacidades = {
+                    equipamento: st.number_input(
+                        equipamento,
+                        min_value=CAPACIDADE_ILIMITADA,
+                        step=1,
+                        value=escola['capacidades'].get(equipamento, CAPACIDADE_PADRAO_EQUIPAMENTO),
+                        key=f"capacidade_{equipamento}"
+                    )
+                    for equipamento in escola['equipamentos']
+                }
+                if st.form_submit_button("💾 Salvar Capacidades"):
+                    if salvar_capacidades(novas_capacidades):
+                        st.success("✅ Capacidades atualizadas!")
+
+        with st.expander("🛠️ Tarefas em Segundo Plano"):
+            st.write(f"Move para o arquivo os agendamentos anteriores a {inicio_periodo_atual().strftime('%d/%m/%Y')}.")
+            if st.button("📦 Arquivar meses encerrados", key="arquivar_antigos"):
+                job_id = enfileirar_job("arquivar_agendamentos", {'corte': inicio_periodo_atual().isoformat()})
+                if job_id is not None:
+                    st.success(f"✅ Arquivamento agendado (job #{job_id}). O worker fará o processamento.")
+            
+            df_jobs = listar_jobs()
+            if df_jobs.empty:
+                st.info("ℹ️ Nenhuma tarefa registrada.")
+            else:
+                st.dataframe(df_jobs, use_container_width=True, hide_index=True)
+
         # Carrega e exibe dados
         if filtro_status_admin == "Todos":
-            df = carregar_dados()
+            df = carregar_dados(incluir_historico=incluir_historico, colunas=COLUNAS_ADMIN, colunar=True)
         else:
-            df = carregar_dados(filtro_status=filtro_status_admin)
+            df = carregar_dados(filtro_status=filtro_status_admin, incluir_historico=incluir_historico,
+                                colunas=COLUNAS_ADMIN, colunar=True)
 
         if df.empty:
             st.info("ℹ️ Nenhuma solicitação encontrada com os filtros selecionados.")
@@ -566,7 +817,11 @@ def tela_admin():
         
         # Interface de aprovação para itens pendentes
         if filtro_status_admin in ["Todos", STATUS_PENDENTE]:
-            df_pendentes = df[df['Status'] == STATUS_PENDENTE] if filtro_status_admin == "Todos" else df
+            # fillna: colunas Arrow propagam NULL na comparação
+            df_pendentes = df[(df['Status'] == STATUS_PENDENTE).fillna(False)] if filtro_status_admin == "Todos" else df
+            if 'arquivado' in df_pendentes.columns:
+                # Agendamentos arquivados são somente leitura
+                df_pendentes = df_pendentes[~df_pendentes['arquivado']]
             
             if not df_pendentes.empty:
                 st.markdown("### ⚡ Ações Rápidas - Pendentes")
@@ -584,13 +839,13 @@ def tela_admin():
                         
                         with col3:
                             if st.button("✅ Aprovar", key=f"aprovar_{row['id']}"):
-                                if atualizar_status_agendamento(row['id'], STATUS_APROVADO):
+                                if atualizar_status_agendamento(row['id'], STATUS_APROVADO, usuario=st.session_state.username):
                                     st.success("Aprovado!")
                                     st.rerun()
                         
                         with col4:
                             if st.button("❌ Rejeitar", key=f"rejeitar_{row['id']}"):
-                                if atualizar_status_agendamento(row['id'], STATUS_REJEITADO):
+                                if atualizar_status_agendamento(row['id'], STATUS_REJEITADO, usuario=st.session_state.username):
                                     st.success("Rejeitado!")
                                     st.rerun()
                         
@@ -599,7 +854,7 @@ def tela_admin():
                                 with st.popover("📝 Obs"):
                                     obs = st.text_area("Observações:", key=f"obs_{row['id']}", height=100)
                                     if st.button("💾 Salvar", key=f"salvar_obs_{row['id']}"):
-                                        if atualizar_status_agendamento(row['id'], row['Status'], obs):
+                                        if atualizar_status_agendamento(row['id'], row['Status'], obs, usuario=st.session_state.username):
                                             st.success("Salvo!")
                         
                         st.divider()
@@ -607,13 +862,9 @@ def tela_admin():
         # Tabela completa
         st.markdown("### 📊 Visualização Completa")
         
-        # Prepara dados para exibição
-        df_display = df.copy()
+        # Prepara dados para exibição (Status_Display já vem formatado do banco)
+        df_display = df
         if 'Status' in df_display.columns:
-            df_display['Status_Display'] = df_display['Status'].apply(
-                lambda x: f"{obter_cor_status(x)} {x}"
-            )
-            
             # Reorganiza colunas
             colunas_ordem = ['Data', 'Professor', 'Disciplina', 'Equipamentos', 'Horario', 'Turno', 'Sala', 'Status_Display']
             if 'Observacoes' in df_display.columns:
@@ -624,6 +875,47 @@ def tela_admin():
         
         st.dataframe(df_display, use_container_width=True)
         
+        # Histórico e métricas
+        st.markdown("### 🕓 Histórico de Agendamentos")
+        
+        with st.expander(f"⏱️ Tempo de Resposta (últimos {DIAS_METRICAS_RESPOSTA} dias)"):
+            # Calculado só quando pedido: expanders fechados também executam
+            if st.button("📊 Calcular tempo de resposta", key="calcular_tempo_resposta"):
+                st.session_state.tempo_resposta = calcular_tempo_resposta()
+            resposta = st.session_state.get('tempo_resposta')
+            if 'tempo_resposta' not in st.session_state:
+                st.caption("Clique no botão para calcular com os dados atuais.")
+            elif not resposta or not resposta['respondidos']:
+                st.info("ℹ️ Nenhuma solicitação respondida no período.")
+            else:
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("📨 Respondidas", resposta['respondidos'])
+                with col2:
+                    st.metric("📈 Média", f"{resposta['media_horas']:.1f} h")
+                with col3:
+                    st.metric("📊 Mediana", f"{resposta['mediana_horas']:.1f} h")
+                with col4:
+                    st.metric("🐢 Máximo", f"{resposta['maximo_horas']:.1f} h")
+        
+        # Rótulos montados coluna a coluna, sem percorrer o DataFrame linha a linha
+        textos = (
+            "#" + df['id'].astype("string") + " - " + df['Professor'].fillna("")
+            + " - " + df['Data'].astype("string") + " - Sala " + df['Sala'].fillna("")
+        )
+        rotulos = dict(zip(df['id'].tolist(), textos.tolist()))
+        agendamento_id = st.selectbox(
+            "📌 Selecione um agendamento:",
+            options=list(rotulos),
+            format_func=rotulos.get,
+            key="admin_historico_agendamento"
+        )
+        df_eventos = carregar_eventos(agendamento_id)
+        if df_eventos.empty:
+            st.info("ℹ️ Nenhum evento registrado para este agendamento.")
+        else:
+            st.dataframe(df_eventos, use_container_width=True, hide_index=True)
+        
     else:
         st.markdown("Visualize todos os agendamentos realizados no sistema.")
         st.warning("⚠️ Sistema em modo básico. Execute a migração para ativar o sistema de aprovação.")
@@ -637,6 +929,8 @@ def tela_admin():
 def tela_login():
     st.sidebar.image("https://images.unsplash.com/photo-1517245386807-bb43f82c33c4?q=80&w=2070&auto=format&fit=crop", use_container_width=True)
     st.sidebar.title("🔐 Login do Sistema")
+    escola = escola_atual()
+    st.sidebar.caption(f"🏫 {escola['nome']}")
 
     tab_login, tab_register = st.sidebar.tabs(["🔑 Login", "📝 Registrar-se"])
 
@@ -662,10 +956,10 @@ def tela_login():
         st.info(f"""
         💡 **Como se cadastrar:**
         
-        🔑 **Código necessário:** `{CODIGO_CADASTRO}`
+        🔑 **Código necessário:** `{escola['codigo_cadastro']}`
         
         **👨‍💼 Para ser ADMINISTRADOR:**
-        Use um destes usernames: {', '.join(ADMINS)}
+        Use um destes usernames: {', '.join(escola['admins'])}
         
         **👩‍🏫 Para ser PROFESSOR:**
         Use qualquer outro username (ex: joao.silva, maria.santos)
@@ -685,7 +979,7 @@ def tela_login():
         if st.button("📝 Registrar"):
             if not codigo_acesso:
                 st.error("❌ Digite o código de acesso!")
-            elif codigo_acesso != CODIGO_CADASTRO:
+            elif codigo_acesso != escola['codigo_cadastro']:
                 st.error("❌ Código de acesso inválido!")
             elif not new_username or not new_password:
                 st.warning("⚠️ Por favor, preencha todos os campos.")
@@ -744,7 +1038,15 @@ def main():
         st.session_state.username = None
 
     if not st.session_state.logged_in:
+        # A escola só pode ser trocada antes do login
+        st.session_state.escola = st.query_params.get("escola", ESCOLA_PADRAO)
         inicializar_banco()
+    
+    try:
+        escola_atual()
+    except LookupError as e:
+        st.error(f"❌ {str(e)}")
+        st.stop()
 
     if not st.session_state.logged_in:
         tela_login()
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""Fila de tarefas em segundo plano (tabela jobs) e o worker que a consome.
+
+Uso:
+    python tarefas.py                          # worker (aplica as migrações ao iniciar)
+    python tarefas.py --migrar                 # só cria/atualiza as tabelas
+    python tarefas.py --resetar-agendamentos   # recria a tabela agendamentos mantendo os dados
+
+O worker lê a conexão de DATABASE_URL ou de .streamlit/secrets.toml e pode ser
+executado em vários processos ao mesmo tempo (reserva com SKIP LOCKED).
+"""
+import argparse
+import json
+import os
+import time
+import tomllib
+import traceback
+from datetime import date
+
+import sqlalchemy
+
+# --- ESCOLA PADRÃO ---
+# Valores usados apenas para popular a escola padrão na primeira migração
+ID_ESCOLA_PADRAO = 1
+ESCOLA_PADRAO = "padrao"
+OPCOES_PADRAO = {
+    "disciplinas": ["Matemática", "Física", "Química", "Português", "Inglês", "História", "Geografia", "Biologia"],
+    "equipamentos": ["Notebook", "Celular", "Tablet", "Projetor", "Caixa de Som"],
+    "horarios": ["1º", "2º", "3º", "4º", "5º", "6º"],
+    "turnos": ["Manhã", "Tarde"],
+    "salas": ["205", "206"],
+}
+CODIGO_CADASTRO_PADRAO = "SESI2024"  # 🔑 Código para cadastro
+ADMINS_PADRAO = ["admin", "diretor", "coordenador", "secretaria"]  # 👨‍💼 Administradores
+
+# Capacidade de cada equipamento por horário (escola_opcoes.capacidade)
+CAPACIDADE_PADRAO_EQUIPAMENTO = 1  # 💻 Equipamento cadastrado sem capacidade informada
+CAPACIDADE_ILIMITADA = -1          # ♾️ Equipamento sem limite de unidades
+
+# --- SCHEMA ---
+SCHEMA_VERSAO = 1  # 🧱 Versão que o app exige em schema_versao (aplicada por migrar)
+
+# --- ARQUIVAMENTO ---
+TABELA_ARQUIVO = "agendamentos_arquivo"  # 🗄️ Agendamentos de meses encerrados
+COLUNAS_AGENDAMENTO = 'id, tenant_id, "Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor", "Status", "Observacoes", created_at'
+
+# --- STATUS DE JOB ---
+JOB_PENDENTE = "Pendente"
+JOB_EXECUTANDO = "Executando"
+JOB_CONCLUIDO = "Concluído"
+JOB_FALHOU = "Falhou"
+
+# --- CONFIGURAÇÕES DO WORKER ---
+CAMINHO_SECRETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+INTERVALO_OCIOSO_SEGUNDOS = 5     # Espera quando a fila está vazia
+BACKOFF_BASE_SEGUNDOS = 30        # 30s, 60s, 120s, ...
+TIMEOUT_EXECUCAO_MINUTOS = 15     # Job "Executando" além disso é considerado abandonado
+
+SQL_CRIAR_JOBS = f"""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id SERIAL PRIMARY KEY,
+        tenant_id INTEGER NOT NULL,
+        tipo TEXT NOT NULL,
+        chave TEXT,  -- Jobs agendados automaticamente (ex.: "2026-10"), únicos por escola
+        payload JSONB NOT NULL DEFAULT '{{}}',
+        status TEXT NOT NULL DEFAULT '{JOB_PENDENTE}',
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        max_tentativas INTEGER NOT NULL DEFAULT 5,
+        executar_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        resultado TEXT,
+        erro TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_fila ON jobs (status, executar_em);
+    CREATE INDEX IF NOT EXISTS idx_jobs_tenant_created ON jobs (tenant_id, created_at);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_tenant_tipo_chave ON jobs (tenant_id, tipo, chave);
+"""
+
+SQL_CRIAR_AGENDAMENTOS = f"""
+    CREATE TABLE IF NOT EXISTS agendamentos (
+        id SERIAL PRIMARY KEY,
+        tenant_id INTEGER NOT NULL REFERENCES escolas(id),
+        "Data" DATE NOT NULL,
+        "Disciplina" TEXT,
+        "Equipamentos" TEXT,
+        "Horario" TEXT,
+        "Turno" TEXT,
+        "Sala" TEXT,
+        "Professor" TEXT,
+        "Status" TEXT DEFAULT 'Pendente',
+        "Observacoes" TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SQL_INDICES_AGENDAMENTOS = """
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_tenant_data ON agendamentos (tenant_id, "Data");
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_tenant_status ON agendamentos (tenant_id, "Status");
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_tenant_professor ON agendamentos (tenant_id, "Professor", "Data");
+"""
+
+# --- Schema ---
+
+def criar_schema_v1(s):
+    """Cria as tabelas do sistema e leva bancos da versão sem escolas ao modelo multi-escola."""
+    # Banco já em uso antes das escolas: nele nenhum equipamento tinha limite
+    legado = s.execute(sqlalchemy.text("SELECT to_regclass('public.agendamentos') IS NOT NULL")).scalar()
+    s.execute(sqlalchemy.text(f'''
+        CREATE TABLE IF NOT EXISTS escolas (
+            id SERIAL PRIMARY KEY,
+            slug TEXT UNIQUE NOT NULL,
+            nome TEXT NOT NULL,
+            codigo_cadastro TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS escola_opcoes (
+            tenant_id INTEGER NOT NULL REFERENCES escolas(id),
+            categoria TEXT NOT NULL,
+            valor TEXT NOT NULL,
+            ordem INTEGER NOT NULL DEFAULT 0,
+            capacidade INTEGER NOT NULL DEFAULT {CAPACIDADE_PADRAO_EQUIPAMENTO},
+            PRIMARY KEY (tenant_id, categoria, valor)
+        );
+        CREATE TABLE IF NOT EXISTS escola_admins (
+            tenant_id INTEGER NOT NULL REFERENCES escolas(id),
+            username TEXT NOT NULL,
+            PRIMARY KEY (tenant_id, username)
+        );
+    '''))
+    escola_criada = s.execute(
+        sqlalchemy.text("""INSERT INTO escolas (id, slug, nome, codigo_cadastro)
+            VALUES (:id, :slug, :nome, :codigo)
+            ON CONFLICT DO NOTHING
+            RETURNING id"""),
+        {'id': ID_ESCOLA_PADRAO, 'slug': ESCOLA_PADRAO, 'nome': "Escola Padrão", 'codigo': CODIGO_CADASTRO_PADRAO}
+    ).scalar()
+    if escola_criada:
+        s.execute(sqlalchemy.text("SELECT setval(pg_get_serial_sequence('escolas', 'id'), (SELECT MAX(id) FROM escolas))"))
+        # Mantém o comportamento de quem já usava o sistema; instalações novas usam o padrão
+        capacidade = CAPACIDADE_ILIMITADA if legado else CAPACIDADE_PADRAO_EQUIPAMENTO
+        s.execute(
+            sqlalchemy.text("""INSERT INTO escola_opcoes (tenant_id, categoria, valor, ordem, capacidade)
+                VALUES (:tenant_id, :categoria, :valor, :ordem, :capacidade)"""),
+            [
+                {'tenant_id': ID_ESCOLA_PADRAO, 'categoria': categoria, 'valor': valor, 'ordem': ordem, 'capacidade': capacidade}
+                for categoria, valores in OPCOES_PADRAO.items()
+                for ordem, valor in enumerate(valores)
+            ]
+        )
+        s.execute(
+            sqlalchemy.text("INSERT INTO escola_admins (tenant_id, username) VALUES (:tenant_id, :user)"),
+            [{'tenant_id': ID_ESCOLA_PADRAO, 'user': admin} for admin in ADMINS_PADRAO]
+        )
+
+    s.execute(sqlalchemy.text('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id SERIAL PRIMARY KEY,
+            tenant_id INTEGER NOT NULL REFERENCES escolas(id),
+            username TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    '''))
+    s.execute(sqlalchemy.text(SQL_CRIAR_AGENDAMENTOS))
+
+    # Bancos antigos: linhas existentes ficam na escola padrão; novas inserções informam a escola
+    for tabela in ('usuarios', 'agendamentos'):
+        s.execute(sqlalchemy.text(
+            f'ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS tenant_id INTEGER NOT NULL DEFAULT {ID_ESCOLA_PADRAO} REFERENCES escolas(id)'
+        ))
+        s.execute(sqlalchemy.text(f'ALTER TABLE {tabela} ALTER COLUMN tenant_id DROP DEFAULT'))
+    s.execute(sqlalchemy.text('''ALTER TABLE agendamentos
+        ADD COLUMN IF NOT EXISTS "Status" TEXT DEFAULT 'Pendente',
+        ADD COLUMN IF NOT EXISTS "Observacoes" TEXT'''))
+
+    # Usuário é único por escola
+    s.execute(sqlalchemy.text('ALTER TABLE usuarios DROP CONSTRAINT IF EXISTS usuarios_username_key'))
+    s.execute(sqlalchemy.text('CREATE UNIQUE INDEX IF NOT EXISTS idx_usuarios_tenant_username ON usuarios (tenant_id, username)'))
+    s.execute(sqlalchemy.text(SQL_INDICES_AGENDAMENTOS))
+
+    s.execute(sqlalchemy.text(f'''
+        CREATE TABLE IF NOT EXISTS {TABELA_ARQUIVO} (
+            id INTEGER PRIMARY KEY,
+            tenant_id INTEGER NOT NULL REFERENCES escolas(id),
+            "Data" DATE NOT NULL,
+            "Disciplina" TEXT,
+            "Equipamentos" TEXT,
+            "Horario" TEXT,
+            "Turno" TEXT,
+            "Sala" TEXT,
+            "Professor" TEXT,
+            "Status" TEXT,
+            "Observacoes" TEXT,
+            created_at TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_{TABELA_ARQUIVO}_tenant_data ON {TABELA_ARQUIVO} (tenant_id, "Data");
+    '''))
+    s.execute(sqlalchemy.text(SQL_CRIAR_JOBS))
+
+    # Histórico de eventos: somente inserção
+    s.execute(sqlalchemy.text('''
+        CREATE TABLE IF NOT EXISTS agendamento_eventos (
+            id BIGSERIAL PRIMARY KEY,
+            tenant_id INTEGER NOT NULL REFERENCES escolas(id),
+            agendamento_id INTEGER NOT NULL,
+            ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            tipo TEXT NOT NULL,
+            usuario TEXT,
+            status_anterior TEXT,
+            status_novo TEXT,
+            observacoes TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_eventos_tenant_agendamento_ts ON agendamento_eventos (tenant_id, agendamento_id, ts);
+        CREATE INDEX IF NOT EXISTS idx_eventos_tenant_ts ON agendamento_eventos (tenant_id, ts);
+
+        CREATE OR REPLACE FUNCTION bloquear_alteracao_eventos() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'agendamento_eventos aceita apenas inserções';
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS trg_eventos_somente_insercao ON agendamento_eventos;
+        CREATE TRIGGER trg_eventos_somente_insercao
+            BEFORE UPDATE OR DELETE ON agendamento_eventos
+            FOR EACH ROW EXECUTE FUNCTION bloquear_alteracao_eventos();
+    '''))
+
+# Versão -> função(s) que leva o banco da versão anterior até ela
+MIGRACOES = {
+    1: criar_schema_v1,
+}
+
+def versao_schema(s):
+    """Retorna a versão do schema gravada no banco (0 se nunca foi migrado)."""
+    if not s.execute(sqlalchemy.text("SELECT to_regclass('public.schema_versao') IS NOT NULL")).scalar():
+        return 0
+    return s.execute(sqlalchemy.text("SELECT COALESCE(MAX(versao), 0) FROM schema_versao")).scalar()
+
+def migrar(s):
+    """Aplica as migrações pendentes até SCHEMA_VERSAO. Retorna a versão anterior.
+
+    Vários workers podem iniciar juntos: a trava consultiva serializa as
+    migrações e quem chega depois encontra o banco já atualizado.
+    """
+    s.execute(sqlalchemy.text("SELECT pg_advisory_xact_lock(hashtextextended('schema_versao', 0))"))
+    anterior = versao_schema(s)
+    s.execute(sqlalchemy.text("CREATE TABLE IF NOT EXISTS schema_versao (versao INTEGER PRIMARY KEY, aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"))
+    for versao in range(anterior + 1, SCHEMA_VERSAO + 1):
+        MIGRACOES[versao](s)
+        s.execute(sqlalchemy.text("INSERT INTO schema_versao (versao) VALUES (:versao)"), {'versao': versao})
+    return anterior
+
+def resetar_agendamentos(s):
+    """Recria a tabela agendamentos mantendo os dados, o id e a escola de cada linha."""
+    s.execute(sqlalchemy.text("DROP TABLE IF EXISTS agendamentos_backup"))
+    s.execute(sqlalchemy.text("CREATE TABLE agendamentos_backup AS SELECT * FROM agendamentos"))
+    s.execute(sqlalchemy.text("DROP TABLE agendamentos"))
+    s.execute(sqlalchemy.text(SQL_CRIAR_AGENDAMENTOS))
+    # Todas as colunas voltam, inclusive o id (histórico e arquivo dependem dele)
+    s.execute(sqlalchemy.text(f"""
+        INSERT INTO agendamentos ({COLUNAS_AGENDAMENTO})
+        SELECT {COLUNAS_AGENDAMENTO} FROM agendamentos_backup
+    """))
+    # Próximo id continua depois de todos os já usados, inclusive os arquivados
+    s.execute(sqlalchemy.text(f"""
+        SELECT setval(
+            pg_get_serial_sequence('agendamentos', 'id'),
+            COALESCE(GREATEST((SELECT MAX(id) FROM agendamentos), (SELECT MAX(id) FROM {TABELA_ARQUIVO})), 0) + 1,
+            false
+        )
+    """))
+    s.execute(sqlalchemy.text(SQL_INDICES_AGENDAMENTOS))
+    s.execute(sqlalchemy.text("DROP TABLE agendamentos_backup"))
+
+# --- Tarefas ---
+
+def arquivar_agendamentos(s, tenant_id, corte):
+    """Move agendamentos da escola anteriores à data de corte para o arquivo."""
+    result = s.execute(
+        sqlalchemy.text(f"""WITH movidos AS (
+                DELETE FROM agendamentos
+                WHERE tenant_id = :tenant_id AND "Data" < :corte
+                RETURNING {COLUNAS_AGENDAMENTO}
+            )
+            INSERT INTO {TABELA_ARQUIVO} ({COLUNAS_AGENDAMENTO})
+            SELECT {COLUNAS_AGENDAMENTO} FROM movidos"""),
+        {'tenant_id': tenant_id, 'corte': corte}
+    )
+    return f"{result.rowcount} agendamento(s) arquivado(s)"
+
+# Tipo do job -> função(s, tenant_id, **payload) que retorna um texto de resultado
+TAREFAS = {
+    "arquivar_agendamentos": arquivar_agendamentos,
+}
+
+# --- Fila ---
+
+def enfileirar_job(s, tenant_id, tipo, payload=None, max_tentativas=5):
+    """Insere um job da escola na fila. O commit fica a cargo de quem chama."""
+    if tipo not in TAREFAS:
+        raise ValueError(f"Tipo de job desconhecido: {tipo}")
+    result = s.execute(
+        sqlalchemy.text("""INSERT INTO jobs (tenant_id, tipo, payload, max_tentativas)
+            VALUES (:tenant_id, :tipo, CAST(:payload AS JSONB), :max)
+            RETURNING id"""),
+        {'tenant_id': tenant_id, 'tipo': tipo, 'payload': json.dumps(payload or {}), 'max': max_tentativas}
+    )
+    return result.scalar()
+
+def listar_jobs(s, tenant_id, limite=20):
+    """Retorna os jobs mais recentes da escola para exibição."""
+    result = s.execute(
+        sqlalchemy.text("""SELECT id, tipo, status, tentativas, max_tentativas,
+                executar_em, resultado, erro, created_at, updated_at
+            FROM jobs
+            WHERE tenant_id = :tenant_id
+            ORDER BY created_at DESC
+            LIMIT :limite"""),
+        {'tenant_id': tenant_id, 'limite': limite}
+    )
+    return result.mappings().all()
+
+def encerrar_abandonados(s):
+    """Marca como falhos os jobs abandonados que já esgotaram as tentativas."""
+    s.execute(
+        sqlalchemy.text("""UPDATE jobs
+            SET status = :falhou, updated_at = NOW(),
+                erro = COALESCE(erro || ' | ', '') || 'Worker interrompido durante a execução (tentativas esgotadas)'
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status = :executando
+                  AND updated_at < NOW() - make_interval(mins => :timeout)
+                  AND tentativas >= max_tentativas
+                FOR UPDATE SKIP LOCKED
+            )"""),
+        {'falhou': JOB_FALHOU, 'executando': JOB_EXECUTANDO, 'timeout': TIMEOUT_EXECUCAO_MINUTOS}
+    )
+
+def reservar_job(s):
+    """Reserva o próximo job disponível, ignorando os travados por outro worker.
+
+    Um job "Executando" só é retomado se o worker que o executava não segura
+    mais a trava da linha (processo morreu) e ainda restam tentativas.
+    """
+    result = s.execute(
+        sqlalchemy.text("""UPDATE jobs
+            SET status = :executando, tentativas = tentativas + 1, updated_at = NOW()
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = :pendente AND executar_em <= NOW())
+                   OR (status = :executando AND updated_at < NOW() - make_interval(mins => :timeout)
+                       AND tentativas < max_tentativas)
+                ORDER BY executar_em
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, tenant_id, tipo, payload, tentativas, max_tentativas"""),
+        {'executando': JOB_EXECUTANDO, 'pendente': JOB_PENDENTE, 'timeout': TIMEOUT_EXECUCAO_MINUTOS}
+    )
+    return result.mappings().first()
+
+def concluir_job(s, job_id, resultado):
+    """Marca o job como concluído."""
+    s.execute(
+        sqlalchemy.text("""UPDATE jobs
+            SET status = :status, resultado = :resultado, erro = NULL, updated_at = NOW()
+            WHERE id = :id"""),
+        {'status': JOB_CONCLUIDO, 'resultado': resultado, 'id': job_id}
+    )
+
+def falhar_job(s, job, erro):
+    """Reagenda o job com backoff exponencial ou marca como falho."""
+    if job['tentativas'] >= job['max_tentativas']:
+        status, atraso = JOB_FALHOU, 0
+    else:
+        status, atraso = JOB_PENDENTE, BACKOFF_BASE_SEGUNDOS * 2 ** (job['tentativas'] - 1)
+    s.execute(
+        sqlalchemy.text("""UPDATE jobs
+            SET status = :status, erro = :erro, updated_at = NOW(),
+                executar_em = NOW() + make_interval(secs => :atraso)
+            WHERE id = :id"""),
+        {'status': status, 'erro': erro, 'atraso': atraso, 'id': job['id']}
+    )
+
+def agendar_arquivamento_mensal(s, hoje=None):
+    """Enfileira um arquivamento por escola para o mês corrente (idempotente)."""
+    inicio_mes = (hoje or date.today()).replace(day=1)
+    result = s.execute(
+        sqlalchemy.text("""INSERT INTO jobs (tenant_id, tipo, chave, payload)
+            SELECT id, 'arquivar_agendamentos', :chave, jsonb_build_object('corte', CAST(:corte AS TEXT))
+            FROM escolas
+            ON CONFLICT (tenant_id, tipo, chave) DO NOTHING"""),
+        {'chave': inicio_mes.strftime("%Y-%m"), 'corte': inicio_mes.isoformat()}
+    )
+    return result.rowcount
+
+# --- Worker ---
+
+def criar_engine():
+    """Cria a engine a partir de DATABASE_URL ou dos secrets do Streamlit."""
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        with open(CAMINHO_SECRETS, "rb") as f:
+            cfg = tomllib.load(f)["connections"]["db_agendamentos"]
+        drivername = cfg["dialect"] + (f"+{cfg['driver']}" if cfg.get("driver") else "")
+        url = sqlalchemy.engine.URL.create(
+            drivername=drivername,
+            username=cfg.get("username"),
+            password=cfg.get("password"),
+            host=cfg.get("host"),
+            port=cfg.get("port"),
+            database=cfg.get("database"),
+            query=cfg.get("query", {}),
+        )
+    return sqlalchemy.create_engine(url, pool_pre_ping=True)
+
+def executar_proximo(engine):
+    """Reserva e executa um job. Retorna False se a fila estiver vazia."""
+    with engine.begin() as s:
+        encerrar_abandonados(s)
+        job = reservar_job(s)
+    if job is None:
+        return False
+
+    try:
+        with engine.begin() as s:
+            # Segura a linha do job enquanto a tarefa roda: outros workers a
+            # ignoram (SKIP LOCKED) mesmo que passe de TIMEOUT_EXECUCAO_MINUTOS
+            s.execute(sqlalchemy.text("SELECT id FROM jobs WHERE id = :id FOR UPDATE"), {'id': job['id']})
+            # A tarefa e a conclusão do job são gravadas na mesma transação
+            resultado = TAREFAS[job['tipo']](s, job['tenant_id'], **job['payload'])
+            concluir_job(s, job['id'], resultado)
+        print(f"✅ Job {job['id']} ({job['tipo']}): {resultado}")
+    except Exception as e:
+        with engine.begin() as s:
+            falhar_job(s, job, f"{type(e).__name__}: {e}")
+        print(f"❌ Job {job['id']} ({job['tipo']}) falhou na tentativa {job['tentativas']}:")
+        traceback.print_exc()
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de tarefas e migrações do banco.")
+    parser.add_argument("--migrar", action="store_true", help="aplica as migrações pendentes e sai")
+    parser.add_argument("--resetar-agendamentos", action="store_true",
+                        help="recria a tabela agendamentos mantendo os dados e sai")
+    args = parser.parse_args()
+
+    engine = criar_engine()
+    if args.resetar_agendamentos:
+        with engine.begin() as s:
+            resetar_agendamentos(s)
+        print("✅ Tabela 'agendamentos' recriada com sucesso!")
+        return
+
+    with engine.begin() as s:
+        anterior = migrar(s)
+    if anterior < SCHEMA_VERSAO:
+        print(f"🧱 Banco migrado da versão {anterior} para a {SCHEMA_VERSAO}.")
+    if args.migrar:
+        return
+
+    print("🛠️ Worker iniciado. Aguardando jobs...")
+    mes_agendado = None
+    while True:
+        try:
+            # Na virada do mês (e ao iniciar) agenda o arquivamento de cada escola
+            if mes_agendado != date.today().strftime("%Y-%m"):
+                with engine.begin() as s:
+                    novos = agendar_arquivamento_mensal(s)
+                mes_agendado = date.today().strftime("%Y-%m")
+                if novos:
+                    print(f"🗄️ {novos} arquivamento(s) mensal(is) agendado(s).")
+            
+            if not executar_proximo(engine):
+                time.sleep(INTERVALO_OCIOSO_SEGUNDOS)
+        except KeyboardInterrupt:
+            print("👋 Worker encerrado.")
+            break
+        except Exception:
+            # Falha de conexão etc.: espera e tenta de novo
+            traceback.print_exc()
+            time.sleep(INTERVALO_OCIOSO_SEGUNDOS)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Teste de carga: aprovações simultâneas não podem ultrapassar sala nem equipamento.
+
+Usa um banco Postgres descartável (as tabelas são migradas com tarefas.migrar e
+recebem uma escola de teste a cada execução):
+
+    DATABASE_URL=postgresql://... python -m pytest tests/test_aprovacao_concorrente.py
+
+Sem DATABASE_URL o módulo é ignorado. APROVACOES_CONCORRENTES (padrão 200)
+ajusta o tamanho da carga e THREADS_CONCORRENTES (padrão: igual às aprovações)
+quantas rodam ao mesmo tempo. Cada thread segura uma conexão, então o servidor
+precisa de max_connections acima de THREADS_CONCORRENTES; com menos o teste é
+ignorado. Um Postgres local serve, por exemplo:
+
+    postgres -D dados -c max_connections=300
+"""
+import os
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+import sqlalchemy
+import sqlalchemy.orm
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+APROVACOES = int(os.environ.get("APROVACOES_CONCORRENTES", 200))
+THREADS = int(os.environ.get("THREADS_CONCORRENTES", APROVACOES))
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="DATABASE_URL não definida")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ConexaoTeste:
+    """Imita st.connection: cada acesso a .session abre uma sessão nova."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    @property
+    def session(self):
+        return sqlalchemy.orm.Session(self.engine)
+
+
+@pytest.fixture(scope="module")
+def banco():
+    engine = sqlalchemy.create_engine(DATABASE_URL, pool_size=THREADS, max_overflow=0)
+    with engine.connect() as s:
+        livres = s.execute(sqlalchemy.text("""SELECT current_setting('max_connections')::int
+            - current_setting('superuser_reserved_connections')::int
+            - (SELECT COUNT(*) FROM pg_stat_activity)""")).scalar()
+    if livres < THREADS:
+        engine.dispose()
+        pytest.skip(f"{THREADS} threads precisam de {THREADS} conexões; o servidor só tem {livres} livres")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def app(banco):
+    import app as modulo
+    import tarefas
+    with banco.begin() as s:
+        tarefas.migrar(s)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(modulo, "init_connection", lambda: ConexaoTeste(banco))
+        yield modulo
+
+
+@pytest.fixture
+def escola(app, banco, monkeypatch):
+    """Cria uma escola isolada com um Projetor de capacidade 3 e Notebooks sem limite."""
+    slug = f"teste-{uuid.uuid4().hex[:8]}"
+    with banco.begin() as s:
+        tenant_id = s.execute(
+            sqlalchemy.text("""INSERT INTO escolas (slug, nome, codigo_cadastro)
+                VALUES (:slug, 'Escola de Teste', 'TESTE') RETURNING id"""),
+            {'slug': slug}
+        ).scalar()
+        s.execute(
+            sqlalchemy.text("""INSERT INTO escola_opcoes (tenant_id, categoria, valor, ordem, capacidade)
+                VALUES (:tenant_id, 'equipamentos', 'Projetor', 0, 3),
+                       (:tenant_id, 'equipamentos', 'Notebook', 1, :ilimitada)"""),
+            {'tenant_id': tenant_id, 'ilimitada': app.CAPACIDADE_ILIMITADA}
+        )
+    config = app.carregar_config_escola(slug)
+    monkeypatch.setattr(app, "escola_atual", lambda: config)
+    monkeypatch.setattr(app, "tenant_atual", lambda: config['id'])
+    return config
+
+
+def criar_pendentes(banco, tenant_id, salas, equipamentos):
+    """Insere um agendamento pendente por sala, todos no mesmo horário."""
+    data = date.today() + timedelta(days=7)
+    with banco.begin() as s:
+        result = s.execute(
+            sqlalchemy.text("""INSERT INTO agendamentos
+                    (tenant_id, "Data", "Disciplina", "Equipamentos", "Horario", "Turno", "Sala", "Professor", "Status")
+                SELECT :tenant_id, :data, 'Física', :equip, '1º', 'Manhã', sala, 'prof_' || sala, 'Pendente'
+                FROM unnest(CAST(:salas AS TEXT[])) AS sala
+                RETURNING id"""),
+            {'tenant_id': tenant_id, 'data': data, 'equip': equipamentos, 'salas': salas}
+        )
+        return [row[0] for row in result]
+
+
+def aprovar_simultaneamente(app, ids):
+    """Dispara uma aprovação por agendamento, todas liberadas ao mesmo tempo."""
+    largada = threading.Event()
+
+    def aprovar(agendamento_id):
+        largada.wait()
+        return app.atualizar_status_agendamento(agendamento_id, app.STATUS_APROVADO, usuario="carga")
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        futuros = [executor.submit(aprovar, agendamento_id) for agendamento_id in ids]
+        largada.set()
+        return [futuro.result() for futuro in futuros]
+
+
+def contar_aprovados(banco, tenant_id):
+    with banco.connect() as s:
+        return s.execute(
+            sqlalchemy.text("""SELECT COUNT(*) FROM agendamentos
+                WHERE tenant_id = :tenant_id AND "Status" = 'Aprovado'"""),
+            {'tenant_id': tenant_id}
+        ).scalar()
+
+
+def test_mesma_sala_aprova_apenas_um(app, banco, escola):
+    ids = criar_pendentes(banco, escola['id'], ["205"] * APROVACOES, "Notebook")
+
+    resultados = aprovar_simultaneamente(app, ids)
+
+    assert sum(resultados) == 1
+    assert contar_aprovados(banco, escola['id']) == 1
+
+
+def test_equipamento_respeita_capacidade(app, banco, escola):
+    capacidade = escola['capacidades']['Projetor']
+    salas = [f"S{i}" for i in range(APROVACOES)]
+    ids = criar_pendentes(banco, escola['id'], salas, "Projetor")
+
+    resultados = aprovar_simultaneamente(app, ids)
+
+    assert sum(resultados) == capacidade
+    assert contar_aprovados(banco, escola['id']) == capacidade